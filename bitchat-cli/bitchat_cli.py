@@ -5,6 +5,7 @@ Implements the same protocol as the main BitChat app
 """
 
 import asyncio
+import collections
 import struct
 import time
 import uuid
@@ -15,6 +16,7 @@ import argparse
 try:
     from bleak import BleakClient, BleakScanner, BLEDevice
     from bleak.backends.characteristic import BleakGATTCharacteristic
+    from bleak.exc import BleakError
 except ImportError:
     print("Error: bleak library not found. Please install it with: pip install bleak")
     exit(1)
@@ -23,6 +25,66 @@ except ImportError:
 BITCHAT_SERVICE_UUID = "f47b5e2d-4a9e-4c5a-9b3f-8e1d2c3a4b5c"
 BITCHAT_CHAR_UUID = "a1b2c3d4-e5f6-4a5b-8c9d-0e1f2a3b4c5d"
 
+# Immutable scanner filter, built once instead of wrapping the UUID in a
+# fresh list per scan
+BITCHAT_SERVICE_UUIDS = (BITCHAT_SERVICE_UUID,)
+
+# Embed message UIDs as 16 raw bytes instead of the 36-byte ASCII UUID form.
+# The UID field is length-prefixed either way, so receivers stay compatible;
+# disable for peers that insist on the ASCII form.
+COMPACT_UID = True
+
+# Precompiled packet headers so the hot send path avoids re-parsing struct
+# format strings on every packet.
+# Outer header (announce and message): type(2B) + ttl + timestamp + flag/reserved + length
+_PKT_HDR = struct.Struct('>BBBQBH')
+# Inner message header: flags + timestamp + uid length
+_MSG_INNER_HDR = struct.Struct('>BQB')
+
+# Recipient ID for broadcast messages; the other framing constants are
+# packed as header-Struct fields above
+_BROADCAST_RECIPIENT = b'\xff' * 8
+
+# Pool of pre-generated message UIDs: one urandom read refills 64 UIDs,
+# so a broadcast loop costs one CSPRNG syscall per 64 messages instead
+# of one per message
+_UID_POOL = collections.deque()
+
+# Display prefixes for the listener, built once instead of per notification
+_ANNOUNCE_PREFIX = "📢"
+_MESSAGE_PREFIX = "💬"
+_UNKNOWN_PREFIX = "❓"
+_WARNING_PREFIX = "⚠️"
+
+def _next_uid() -> bytes:
+    """Return a random 16-byte message UID from the pre-generated pool"""
+    if not _UID_POOL:
+        block = os.urandom(16 * 64)
+        _UID_POOL.extend(block[i:i + 16] for i in range(0, len(block), 16))
+    return _UID_POOL.popleft()
+
+class ParsedPacket:
+    """Decoded BitChat packet
+
+    Slotted instead of a dict so the per-notification allocation stays
+    small and field access skips string-key hashing.
+    """
+    __slots__ = ('type', 'ttl', 'timestamp', 'sender_id', 'sender_name', 'content',
+                 'uid', 'recipient_id', 'msg_sender_id', 'raw_hex', 'parse_error')
+
+    def __init__(self, raw_hex: str):
+        self.type = None
+        self.ttl = None
+        self.timestamp = None
+        self.sender_id = None
+        self.sender_name = None
+        self.content = None
+        self.uid = None
+        self.recipient_id = None
+        self.msg_sender_id = None
+        self.raw_hex = raw_hex
+        self.parse_error = None
+
 class BitChatProtocol:
     """Handles BitChat protocol packet generation and parsing"""
     
@@ -33,123 +95,117 @@ class BitChatProtocol:
         return b"deadbeef"
     
     @staticmethod
-    def parse_packet(data: bytes) -> dict:
+    def parse_packet(data: bytes) -> Optional[ParsedPacket]:
         """Parse a received BitChat packet"""
         if len(data) < 2:
             return None
         
         packet_type = (data[0], data[1])
-        result = {"raw_hex": data.hex()}
+        result = ParsedPacket(data.hex())
+        # Zero-copy view: slices of mv share storage with the GATT payload,
+        # so only the fields we keep get materialized
+        mv = memoryview(data)
         
         try:
             if packet_type == (0x01, 0x01):
-                # Announce packet
-                result["type"] = "announce"
-                offset = 2
-                result["ttl"] = data[offset]
-                offset += 1
-                result["timestamp"] = struct.unpack('>Q', data[offset:offset+8])[0]
+                # Announce packet: whole fixed header in one unpack
+                result.type = "announce"
+                _, _, result.ttl, result.timestamp, _reserved, name_length = _PKT_HDR.unpack_from(data, 0)
+                offset = _PKT_HDR.size
+                result.sender_id = bytes(mv[offset:offset+8])
                 offset += 8
-                offset += 1  # Skip reserved byte
-                name_length = struct.unpack('>H', data[offset:offset+2])[0]
-                offset += 2
-                result["sender_id"] = data[offset:offset+8]
-                offset += 8
-                result["sender_name"] = data[offset:offset+name_length].decode('utf-8', errors='ignore')
-                
+                result.sender_name = str(mv[offset:offset+name_length], 'utf-8', 'ignore')
+
             elif packet_type == (0x01, 0x04):
-                # Message packet
-                result["type"] = "message"
-                offset = 2
-                result["ttl"] = data[offset]
-                offset += 1
-                result["timestamp"] = struct.unpack('>Q', data[offset:offset+8])[0]
+                # Message packet: whole fixed header in one unpack
+                result.type = "message"
+                _, _, result.ttl, result.timestamp, _flags, message_length = _PKT_HDR.unpack_from(data, 0)
+                offset = _PKT_HDR.size
+                result.sender_id = bytes(mv[offset:offset+8])
                 offset += 8
-                offset += 1  # Skip message flag
-                message_length = struct.unpack('>H', data[offset:offset+2])[0]
-                offset += 2
-                result["sender_id"] = data[offset:offset+8]
+                result.recipient_id = bytes(mv[offset:offset+8])
                 offset += 8
-                result["recipient_id"] = data[offset:offset+8]
-                offset += 8
-                
+
                 # Parse inner message
-                msg_offset = offset
-                msg_flags = data[msg_offset]
-                msg_offset += 1
-                msg_timestamp = struct.unpack('>Q', data[msg_offset:msg_offset+8])[0]
-                msg_offset += 8
-                
-                # UID
-                uid_length = data[msg_offset]
-                msg_offset += 1
-                result["uid"] = data[msg_offset:msg_offset+uid_length].decode('utf-8', errors='ignore')
+                msg_flags, msg_timestamp, uid_length = _MSG_INNER_HDR.unpack_from(data, offset)
+                msg_offset = offset + _MSG_INNER_HDR.size
+
+                # UID: 36-byte ASCII UUID or 16 raw bytes (see COMPACT_UID)
+                uid_bytes = bytes(mv[msg_offset:msg_offset+uid_length])
+                result.uid = uid_bytes.decode('utf-8') if uid_bytes.isascii() else uid_bytes.hex()
                 msg_offset += uid_length
-                
+
                 # Sender name
                 name_length = data[msg_offset]
                 msg_offset += 1
-                result["sender_name"] = data[msg_offset:msg_offset+name_length].decode('utf-8', errors='ignore')
+                result.sender_name = str(mv[msg_offset:msg_offset+name_length], 'utf-8', 'ignore')
                 msg_offset += name_length
-                
+
                 # Content
-                content_length = struct.unpack('>H', data[msg_offset:msg_offset+2])[0]
+                content_length = int.from_bytes(mv[msg_offset:msg_offset+2], 'big')
                 msg_offset += 2
-                result["content"] = data[msg_offset:msg_offset+content_length].decode('utf-8', errors='ignore')
+                result.content = str(mv[msg_offset:msg_offset+content_length], 'utf-8', 'ignore')
                 msg_offset += content_length
-                
+
                 # Sender ID in message
                 sender_id_length = data[msg_offset]
                 msg_offset += 1
-                result["msg_sender_id"] = data[msg_offset:msg_offset+sender_id_length]
+                result.msg_sender_id = bytes(mv[msg_offset:msg_offset+sender_id_length])
                 
             else:
-                result["type"] = "unknown"
+                result.type = "unknown"
                 
-        except Exception as e:
-            result["parse_error"] = str(e)
+        except (struct.error, IndexError, ValueError) as e:
+            # Truncated or malformed packet; report it rather than crash the
+            # notification callback. Anything else is a programming error and
+            # should surface.
+            result.parse_error = str(e)
             
         return result
     
     @staticmethod
     def generate_announce_packet(sender_id: bytes, sender_name: bytes, ttl: int = 3) -> bytes:
         """Generate an announce packet matching the working implementation"""
-        announce_packet = bytes()
-        announce_packet += bytes.fromhex("0101")
-        announce_packet += struct.pack('>B', ttl)
-        announce_packet += struct.pack('>Q', int(time.time()) * 1000)
-        announce_packet += bytes.fromhex("00")
-        announce_packet += struct.pack('>H', len(sender_name))
-        announce_packet += sender_id
-        announce_packet += sender_name
-        return announce_packet
+        ts = time.time_ns() // 1_000_000
+        packet = bytearray(_PKT_HDR.size + 8 + len(sender_name))
+        _PKT_HDR.pack_into(packet, 0, 0x01, 0x01, ttl, ts, 0x00, len(sender_name))
+        offset = _PKT_HDR.size
+        packet[offset:offset + 8] = sender_id
+        packet[offset + 8:] = sender_name
+        return bytes(packet)
     
     @staticmethod
     def generate_message_packet(sender_id: bytes, sender_name: bytes, content: bytes, ttl: int = 3) -> bytes:
         """Generate a message packet matching the working implementation"""
-        message = bytes()
-        message += bytes.fromhex("10")  # setting senderPeerID flag
-        message += struct.pack('>Q', int(time.time()) * 1000)
-        uid = str(uuid.uuid4()).encode("utf-8")
-        message += struct.pack('>B', len(uid))
-        message += uid
-        message += struct.pack('>B', len(sender_name))
-        message += sender_name
-        message += struct.pack('>H', len(content))
-        message += content
-        message += struct.pack('>B', len(sender_id))
-        message += sender_id
-        
-        message_packet = bytes()
-        message_packet += bytes.fromhex("0104")
-        message_packet += struct.pack('>B', ttl)
-        message_packet += struct.pack('>Q', int(time.time()) * 1000)
-        message_packet += bytes.fromhex("01")
-        message_packet += struct.pack('>H', len(message))
-        message_packet += sender_id
-        message_packet += bytes.fromhex("ffffffffffffffff")
-        message_packet += message
-        return message_packet
+        ts = time.time_ns() // 1_000_000
+        uid = _next_uid() if COMPACT_UID else str(uuid.uuid4()).encode("utf-8")
+
+        # Size the whole packet up-front and build the inner message in place,
+        # so no intermediate buffer is allocated and copied
+        message_length = _MSG_INNER_HDR.size + len(uid) + 1 + len(sender_name) + 2 + len(content) + 1 + len(sender_id)
+        packet = bytearray(_PKT_HDR.size + 16 + message_length)
+        _PKT_HDR.pack_into(packet, 0, 0x01, 0x04, ttl, ts, 0x01, message_length)
+        offset = _PKT_HDR.size
+        packet[offset:offset + 8] = sender_id
+        packet[offset + 8:offset + 16] = _BROADCAST_RECIPIENT
+        offset += 16
+
+        # Inner message: flags + timestamp + length-prefixed uid/name/content/sender_id
+        _MSG_INNER_HDR.pack_into(packet, offset, 0x10, ts, len(uid))  # 0x10 sets senderPeerID flag
+        offset += _MSG_INNER_HDR.size
+        packet[offset:offset + len(uid)] = uid
+        offset += len(uid)
+        packet[offset] = len(sender_name)
+        offset += 1
+        packet[offset:offset + len(sender_name)] = sender_name
+        offset += len(sender_name)
+        struct.pack_into('>H', packet, offset, len(content))
+        offset += 2
+        packet[offset:offset + len(content)] = content
+        offset += len(content)
+        packet[offset] = len(sender_id)
+        packet[offset + 1:] = sender_id
+        return bytes(packet)
 
 class BitChatCLI:
     """Main CLI application for BitChat"""
@@ -167,18 +223,19 @@ class BitChatCLI:
         devices = await BleakScanner.discover(
             timeout=timeout,
             return_adv=True,
-            service_uuids=[BITCHAT_SERVICE_UUID]
+            service_uuids=BITCHAT_SERVICE_UUIDS
         )
         
-        bitchat_devices = []
-        
-        if not devices:
+        # The scanner already filtered on the service UUID, so collect the
+        # devices in one comprehension instead of growing a list per hit
+        bitchat_devices = [d for d, a in devices.values()]
+
+        if not bitchat_devices:
             print("No BitChat devices found.")
         else:
-            print(f"Found {len(devices)} device(s) advertising BitChat service:")
-            for d, a in devices.values():
+            print(f"Found {len(bitchat_devices)} device(s) advertising BitChat service:")
+            for d in bitchat_devices:
                 print(f"  - {d.name or 'Unknown'} ({d.address})")
-                bitchat_devices.append(d)
         
         self.devices = bitchat_devices
         
@@ -187,52 +244,65 @@ class BitChatCLI:
         
         return bitchat_devices
     
+    def _build_packets(self, sender_name, message) -> tuple:
+        """Build the announce and message packets for one logical send
+
+        Accepts str or already-encoded bytes for sender_name/message so
+        broadcast_message can encode once for the whole fan-out.
+        """
+        sender_name_bytes = sender_name if isinstance(sender_name, bytes) else sender_name.encode('utf-8')
+        message_bytes = message if isinstance(message, bytes) else message.encode('utf-8')
+
+        announce_packet = BitChatProtocol.generate_announce_packet(self.sender_id, sender_name_bytes)
+        # Message packet with TTL=5 like working script
+        message_packet = BitChatProtocol.generate_message_packet(self.sender_id, sender_name_bytes, message_bytes, ttl=5)
+        return announce_packet, message_packet
+
     async def send_message_to_device(self, device: BLEDevice, sender_name: str, message: str) -> bool:
         """Send a message to a specific device using the same method as working script"""
+        announce_packet, message_packet = self._build_packets(sender_name, message)
+        return await self._send_packets_to_device(device, announce_packet, message_packet)
+
+    async def _send_packets_to_device(self, device: BLEDevice, announce_packet: bytes, message_packet: bytes) -> bool:
+        """Write prebuilt announce and message packets to one device
+
+        One connection covers every write to the device: a BLE connect
+        costs hundreds of milliseconds, so future refactors must keep the
+        BleakClient scope around all writes, never per packet.
+        """
         try:
             async with BleakClient(device.address, timeout=2) as client:
-                # Check for BitChat characteristic exactly like the working script
-                bitchat_device = False
-                for service in client.services:
-                    for char in service.characteristics:
-                        if str(char.uuid).upper() == BITCHAT_CHAR_UUID.upper():
-                            bitchat_device = True
-                            break
-                
-                if not bitchat_device:
+                # Check for the BitChat characteristic via bleak's indexed lookup
+                if client.services.get_characteristic(BITCHAT_CHAR_UUID) is None:
                     if self.debug:
                         print(f"  {device.name or device.address} is not a BitChat device")
                     return False
-                
+
                 print(f"Found BitChat device: {device.address} Sending Messages...")
-                
-                # Convert strings to bytes exactly like the working script
-                sender_name_bytes = sender_name.encode('utf-8')
-                message_bytes = message.encode('utf-8')
-                
-                # Send announce packet
-                announce_packet = BitChatProtocol.generate_announce_packet(self.sender_id, sender_name_bytes)
-                
+
                 if self.debug:
+                    # bleak negotiates the MTU during connect; larger values
+                    # mean fewer PDUs per packet
+                    print(f"  DEBUG: Negotiated MTU: {client.mtu_size}")
                     print(f"  DEBUG: Announce packet ({len(announce_packet)} bytes): {announce_packet.hex()}")
                     print(f"  DEBUG: Sender ID: {self.sender_id.decode() if isinstance(self.sender_id, bytes) else self.sender_id}")
-                
+
+                # No delay needed before the next write: ATT serializes writes
+                # at the link layer, so ordering is already guaranteed
                 await client.write_gatt_char(BITCHAT_CHAR_UUID, announce_packet, response=False)
-                await asyncio.sleep(0.5)
-                
-                # Send message packet with TTL=5 like working script
-                message_packet = BitChatProtocol.generate_message_packet(self.sender_id, sender_name_bytes, message_bytes, ttl=5)
-                
+
                 if self.debug:
                     print(f"  DEBUG: Message packet ({len(message_packet)} bytes): {message_packet.hex()}")
-                
+
+                # Write-without-response PDUs are queued on the link; the
+                # backend drains them before the disconnect completes, so no
+                # settling sleep is needed here either
                 await client.write_gatt_char(BITCHAT_CHAR_UUID, message_packet, response=False)
-                await asyncio.sleep(0.5)
-                
+
                 print(f"✓ Message sent successfully")
                 return True
                 
-        except Exception as e:
+        except (BleakError, asyncio.TimeoutError, OSError) as e:
             error_msg = str(e)
             if "connect" in error_msg.lower():
                 print(f"  Could not connect to {device.name or device.address}")
@@ -242,6 +312,44 @@ class BitChatCLI:
                 print(f"  Error with {device.name or device.address}: {error_msg}")
             return False
     
+    def _on_notification(self, sender, data) -> None:
+        """Print an incoming BLE notification
+
+        A bound method rather than a per-connection closure, so the
+        callback avoids cell-variable lookups on every notification.
+        """
+        parsed = BitChatProtocol.parse_packet(data)
+
+        if parsed is None:
+            print(f"Received invalid packet ({len(data)} bytes)")
+            return
+
+        if self.debug:
+            print(f"DEBUG: Raw data ({len(data)} bytes): {data.hex()}")
+
+        # A truncated packet leaves fields at None, so don't try to render it
+        if parsed.parse_error is not None:
+            print(f"{_WARNING_PREFIX}  Parse error: {parsed.parse_error}")
+            if self.debug:
+                print(f"   Raw: {parsed.raw_hex}")
+            return
+
+        if parsed.type == "announce":
+            print(f"{_ANNOUNCE_PREFIX} {parsed.sender_name} joined the chat")
+            if self.debug:
+                print(f"   Sender ID: {parsed.sender_id.hex()}")
+
+        elif parsed.type == "message":
+            timestamp = parsed.timestamp or 0
+            time_str = time.strftime("%H:%M:%S", time.localtime(timestamp / 1000))
+            print(f"{_MESSAGE_PREFIX} [{time_str}] {parsed.sender_name}: {parsed.content}")
+            if self.debug:
+                print(f"   UID: {parsed.uid or 'unknown'}")
+                print(f"   Sender ID: {parsed.sender_id.hex()}")
+
+        elif parsed.type == "unknown":
+            print(f"{_UNKNOWN_PREFIX} Unknown packet type: {data[0]:02x} {data[1]:02x}")
+
     async def listen_for_messages(self, device: BLEDevice, duration: float = 60.0) -> None:
         """Listen for incoming messages from a device"""
         try:
@@ -252,16 +360,8 @@ class BitChatCLI:
                     print(f"Failed to connect to {device.name or device.address}")
                     return
                 
-                # Find the BitChat characteristic
-                char = None
-                for service in client.services:
-                    if service.uuid.lower() == BITCHAT_SERVICE_UUID.lower():
-                        for characteristic in service.characteristics:
-                            if characteristic.uuid.lower() == BITCHAT_CHAR_UUID.lower():
-                                char = characteristic
-                                break
-                        break
-                
+                # Find the BitChat characteristic via bleak's indexed lookup
+                char = client.services.get_characteristic(BITCHAT_CHAR_UUID)
                 if not char:
                     print(f"BitChat service not found on {device.name or device.address}")
                     return
@@ -269,41 +369,9 @@ class BitChatCLI:
                 print(f"Connected. Listening for messages for {duration} seconds...")
                 print("Press Ctrl+C to stop listening\n")
                 
-                # Define callback for notifications
-                def notification_handler(sender, data):
-                    parsed = BitChatProtocol.parse_packet(data)
-                    
-                    if parsed is None:
-                        print(f"Received invalid packet ({len(data)} bytes)")
-                        return
-                    
-                    if self.debug:
-                        print(f"DEBUG: Raw data ({len(data)} bytes): {data.hex()}")
-                    
-                    if parsed["type"] == "announce":
-                        print(f"📢 {parsed['sender_name']} joined the chat")
-                        if self.debug:
-                            print(f"   Sender ID: {parsed['sender_id'].hex()}")
-                            
-                    elif parsed["type"] == "message":
-                        timestamp = parsed.get("timestamp", 0)
-                        time_str = time.strftime("%H:%M:%S", time.localtime(timestamp / 1000))
-                        print(f"💬 [{time_str}] {parsed['sender_name']}: {parsed['content']}")
-                        if self.debug:
-                            print(f"   UID: {parsed.get('uid', 'unknown')}")
-                            print(f"   Sender ID: {parsed['sender_id'].hex()}")
-                            
-                    elif parsed["type"] == "unknown":
-                        print(f"❓ Unknown packet type: {data[0]:02x} {data[1]:02x}")
-                        
-                    if "parse_error" in parsed:
-                        print(f"⚠️  Parse error: {parsed['parse_error']}")
-                        if self.debug:
-                            print(f"   Raw: {parsed['raw_hex']}")
-                
                 # Check if characteristic supports notifications
                 if "notify" in char.properties or "indicate" in char.properties:
-                    await client.start_notify(char, notification_handler)
+                    await client.start_notify(char, self._on_notification)
                     
                     # Wait for the specified duration
                     await asyncio.sleep(duration)
@@ -311,24 +379,11 @@ class BitChatCLI:
                     await client.stop_notify(char)
                     print(f"\nStopped listening after {duration} seconds")
                 else:
-                    print("This characteristic doesn't support notifications. Trying to read...")
-                    
-                    # Poll for messages
-                    start_time = asyncio.get_event_loop().time()
-                    while asyncio.get_event_loop().time() - start_time < duration:
-                        try:
-                            data = await client.read_gatt_char(char)
-                            if data:
-                                print(f"Read {len(data)} bytes")
-                                if self.debug:
-                                    print(f"DEBUG: {data.hex()}")
-                        except Exception as e:
-                            if self.debug:
-                                print(f"DEBUG: Read error: {e}")
+                    # Without notify/indicate the device can't push messages;
+                    # polling reads would just burn radio and CPU for nothing
+                    print("This characteristic doesn't support notifications; exiting listen mode")
                         
-                        await asyncio.sleep(2)  # Poll every 2 seconds
-                        
-        except Exception as e:
+        except (BleakError, asyncio.TimeoutError, OSError) as e:
             print(f"Error listening to {device.name or device.address}: {e}")
     
     async def broadcast_message(self, sender_name: str, message: str) -> int:
@@ -337,17 +392,23 @@ class BitChatCLI:
             print("No devices found.")
             return 0
         
+        # Build the packets once for the whole fan-out: it is one logical
+        # message, so every peer gets the same UID (which is what mesh
+        # deduplication expects) and packet assembly leaves the per-device path
+        announce_packet, message_packet = self._build_packets(sender_name, message)
+
+        # Fan out to all devices concurrently; each send is latency-bound on
+        # its own BLE link, so the broadcast takes max-of-devices, not sum
+        tasks = [self._send_packets_to_device(device, announce_packet, message_packet) for device in self.devices]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
         success_count = 0
-        for device in self.devices:
-            try:
-                result = await self.send_message_to_device(device, sender_name, message)
-                if result:
-                    success_count += 1
-            except Exception as e:
-                if self.debug:
-                    print(f"  Error with {device.address}: {e}")
-                continue
-        
+        for device, result in zip(self.devices, results):
+            if result is True:
+                success_count += 1
+            elif isinstance(result, BaseException) and self.debug:
+                print(f"  Error with {device.address}: {result}")
+
         print(f"\nBroadcast complete: {success_count}/{len(self.devices)} devices reached")
         
         return success_count
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
+import gzip
+import hashlib
 import http.server
-import socketserver
+import socket
 import ssl
 import os
 import sys
@@ -8,37 +10,154 @@ import sys
 PORT = 8000
 HTTPS_PORT = 8443
 
+class BitChatHTTPServer(http.server.ThreadingHTTPServer):
+    """Threaded server tuned for the PWA's many small asset responses"""
+    # Restarting right after Ctrl+C shouldn't fail on a TIME_WAIT socket
+    allow_reuse_address = True
+
+    def server_bind(self):
+        super().server_bind()
+        # Accepted sockets inherit these options: TCP_NODELAY avoids Nagle
+        # stalls on small header-only responses, and the larger send buffer
+        # keeps the JS bundle from draining in tiny chunks
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+
+# In-memory cache for the PWA's small text assets, validated by mtime:
+# path -> (mtime, body, gzipped body, etag, content type). Cache hits skip
+# the open/read entirely; binary assets still stream from disk.
+_CACHED_SUFFIXES = ('.js', '.css', '.html', '.json', '.svg', '.webmanifest')
+_ASSET_CACHE = {}
+
+# The three PWA headers every response carries, preformatted once so
+# end_headers appends one bytes object instead of string-formatting three
+_EXTRA_HEADERS = (b"Cross-Origin-Embedder-Policy: require-corp\r\n"
+                  b"Cross-Origin-Opener-Policy: same-origin\r\n"
+                  b"Service-Worker-Allowed: /\r\n")
+
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep-alive: one TCP (and TLS) handshake covers the PWA's whole burst of
+    # asset fetches instead of one handshake per file
+    protocol_version = "HTTP/1.1"
+
     def end_headers(self):
-        self.send_header('Cross-Origin-Embedder-Policy', 'require-corp')
-        self.send_header('Cross-Origin-Opener-Policy', 'same-origin')
-        self.send_header('Service-Worker-Allowed', '/')
+        # Appending to _headers_buffer coalesces the blob into the base
+        # class's single header send instead of extra wfile writes
+        if not hasattr(self, '_headers_buffer'):
+            self._headers_buffer = []
+        self._headers_buffer.append(_EXTRA_HEADERS)
         super().end_headers()
 
     def do_GET(self):
         if self.path == '/':
             self.path = '/index.html'
+        if self.send_cached():
+            return
         return super().do_GET()
 
+    def send_cached(self):
+        """Serve a text asset from the in-memory cache; returns False to fall back"""
+        if not self.path.endswith(_CACHED_SUFFIXES):
+            return False
+
+        path = self.translate_path(self.path)
+        try:
+            mtime = os.stat(path).st_mtime
+            entry = _ASSET_CACHE.get(path)
+            if entry is None or entry[0] != mtime:
+                with open(path, 'rb') as f:
+                    body = f.read()
+                # gzip mtime=0 keeps the output stable for identical content
+                entry = (mtime, body, gzip.compress(body, mtime=0),
+                         f'"{hashlib.md5(body).hexdigest()}"', self.guess_type(path))
+                _ASSET_CACHE[path] = entry
+        except OSError:
+            return False  # let the base handler produce the 404
+
+        _, body, gzipped, etag, ctype = entry
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        out = gzipped if use_gzip else body
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(out)))
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(out)
+        return True
+
+    def copyfile(self, source, outputfile):
+        """Stream a file with zero-copy os.sendfile where it's safe"""
+        # sendfile would write past the TLS layer, so only plain HTTP can use
+        # it; sources without a real fd (e.g. error-page BytesIO) fall back
+        if hasattr(os, 'sendfile') and not isinstance(self.connection, ssl.SSLSocket):
+            try:
+                out_fd = outputfile.fileno()
+                in_fd = source.fileno()
+            except (OSError, ValueError, AttributeError):
+                pass
+            else:
+                # Track the offset explicitly: offset=None is Linux-only and
+                # raises TypeError on macOS/FreeBSD builds of os.sendfile
+                offset = source.tell()
+                sent_any = False
+                try:
+                    while True:
+                        sent = os.sendfile(out_fd, in_fd, offset, 1 << 20)
+                        if sent == 0:
+                            return
+                        offset += sent
+                        sent_any = True
+                except OSError:
+                    if sent_any:
+                        raise  # mid-stream failure; a retry would duplicate bytes
+                    # kernel refused up front, use the copy loop instead
+        return super().copyfile(source, outputfile)
+
 def create_self_signed_cert():
-    """Create a self-signed certificate for HTTPS testing"""
-    from datetime import datetime, timedelta
+    """Create (or reuse a cached) self-signed certificate for HTTPS testing"""
+    from datetime import datetime, timedelta, timezone
+    import pathlib
     import tempfile
-    
+
     try:
         from cryptography import x509
         from cryptography.x509.oid import NameOID
         from cryptography.hazmat.primitives import hashes
-        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.primitives.asymmetric import ec
         from cryptography.hazmat.primitives import serialization
     except ImportError:
         print("\nNote: For HTTPS support, install cryptography: pip install cryptography")
         return None, None
-    
-    key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-    )
+
+    cache_dir = pathlib.Path(tempfile.gettempdir()) / "bitchat-pwa-cert"
+    cert_path = cache_dir / "cert.pem"
+    key_path = cache_dir / "key.pem"
+
+    # Reuse the cached pair while the certificate is still comfortably valid.
+    # Key generation dominates startup time, and reusing the cert also means
+    # the browser only has to accept the security warning once.
+    if cert_path.exists() and key_path.exists():
+        try:
+            cert = x509.load_pem_x509_certificate(cert_path.read_bytes())
+            if cert.not_valid_after_utc > datetime.now(timezone.utc) + timedelta(days=1):
+                return str(cert_path), str(key_path)
+        except (ValueError, OSError):
+            pass  # unreadable cache, regenerate below
+
+    # ECDSA P-256 keygen is effectively instant where RSA-2048 costs a prime
+    # search, and unlike Ed25519 every browser's TLS stack accepts it —
+    # Chromium (the only Web Bluetooth engine) doesn't offer ed25519 in its
+    # signature_algorithms, so an Ed25519 cert fails the handshake outright
+    key = ec.generate_private_key(ec.SECP256R1())
     
     subject = issuer = x509.Name([
         x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
@@ -68,19 +187,22 @@ def create_self_signed_cert():
         critical=False,
     ).sign(key, hashes.SHA256())
     
-    cert_file = tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.pem')
-    cert_file.write(cert.public_bytes(serialization.Encoding.PEM))
-    cert_file.close()
-    
-    key_file = tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.key')
-    key_file.write(key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.TraditionalOpenSSL,
-        encryption_algorithm=serialization.NoEncryption()
-    ))
-    key_file.close()
-    
-    return cert_file.name, key_file.name
+    # Write atomically so a concurrent server start never sees a partial file
+    cache_dir.mkdir(exist_ok=True)
+    for path, data in (
+        (cert_path, cert.public_bytes(serialization.Encoding.PEM)),
+        (key_path, key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )),
+    ):
+        tmp = tempfile.NamedTemporaryFile(mode='wb', dir=cache_dir, delete=False)
+        tmp.write(data)
+        tmp.close()
+        os.replace(tmp.name, path)
+
+    return str(cert_path), str(key_path)
 
 def serve_https():
     """Serve with HTTPS (required for Web Bluetooth API)"""
@@ -93,7 +215,9 @@ def serve_https():
         return
     
     handler = MyHTTPRequestHandler
-    httpd = socketserver.TCPServer(("", HTTPS_PORT), handler)
+    # Threaded so one client's TLS handshake or slow fetch doesn't block the
+    # PWA's parallel asset requests; daemon threads let Ctrl+C exit cleanly
+    httpd = BitChatHTTPServer(("", HTTPS_PORT), handler)
     
     context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
     context.load_cert_chain(cert_file, key_file)
@@ -111,15 +235,13 @@ def serve_https():
         httpd.serve_forever()
     except KeyboardInterrupt:
         print("\n\nServer stopped.")
-        os.unlink(cert_file)
-        os.unlink(key_file)
         sys.exit(0)
 
 def serve_http():
     """Serve with HTTP (Web Bluetooth won't work)"""
     handler = MyHTTPRequestHandler
     
-    with socketserver.TCPServer(("", PORT), handler) as httpd:
+    with BitChatHTTPServer(("", PORT), handler) as httpd:
         print(f"\n🚀 BitChat PWA Server (HTTP)")
         print(f"   http://localhost:{PORT}")
         print(f"   http://127.0.0.1:{PORT}")